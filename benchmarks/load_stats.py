@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Compares stitch_api.analytics against a plain dict loop on synthetic load batches,
+needs the package and numpy installed, from the repo root:
+
+    pip install -e .[analytics]
+    python benchmarks/load_stats.py --batches 1000000
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from stitch_api import analytics
+
+
+def make_batches(n: int, n_streams: int = 300):
+    start = datetime(2020, 1, 1)
+    batches = []
+    for i in range(n):
+        received = start + timedelta(seconds=i * 2)
+        started = received + timedelta(seconds=random.randint(0, 600))
+        completed = started + timedelta(seconds=random.randint(1, 120))
+        batches.append({'stream_name': 'stream_{}'.format(i % n_streams),
+                        'row_count': random.randint(0, 10000),
+                        'received_at': received.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z',
+                        'started_at': started.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z',
+                        'completed_at': completed.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'})
+    return batches
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    position = (len(values) - 1) * p / 100.0
+    lo = int(position)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (position - lo)
+
+
+def dict_loop_stats(batches):
+    parse = lambda x: datetime.fromisoformat(x[:-1])  # noqa: E731
+    grouped = defaultdict(lambda: {'rows': 0, 'latency': [], 'lag': [], 'first': None, 'last': None})
+    for batch in batches:
+        group = grouped[batch['stream_name']]
+        received = parse(batch['received_at'])
+        started = parse(batch['started_at'])
+        completed = parse(batch['completed_at'])
+        group['rows'] += batch['row_count']
+        group['latency'].append((completed - started).total_seconds())
+        group['lag'].append((completed - received).total_seconds())
+        group['first'] = started if group['first'] is None else min(group['first'], started)
+        group['last'] = completed if group['last'] is None else max(group['last'], completed)
+    stats = []
+    for stream_name, group in grouped.items():
+        minutes = (group['last'] - group['first']).total_seconds() / 60
+        row = {'stream_name': stream_name, 'rows': group['rows'],
+               'rows_per_minute': group['rows'] / minutes if minutes > 0 else float('nan')}
+        for p in analytics.PERCENTILES:
+            row['latency_p{}'.format(p)] = _percentile(group['latency'], p)
+            row['lag_p{}'.format(p)] = _percentile(group['lag'], p)
+        stats.append(row)
+    return stats
+
+
+def vectorized_stats(batches):
+    return analytics.stream_stats(analytics.batches_to_columns(batches))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batches', type=int, default=1000000)
+    parser.add_argument('--streams', type=int, default=300)
+    args = parser.parse_args()
+
+    batches = make_batches(args.batches, args.streams)
+    timings = {}
+    results = {}
+    for name, func in [('dict loop', dict_loop_stats), ('vectorized', vectorized_stats)]:
+        start = time.perf_counter()
+        results[name] = {i['stream_name']: i for i in func(batches)}
+        timings[name] = time.perf_counter() - start
+        print('{:<12}{:.2f}s'.format(name, timings[name]))
+
+    # once converted, the columns can be re-aggregated without touching the dicts again
+    start = time.perf_counter()
+    columns = analytics.batches_to_columns(batches)
+    converted = time.perf_counter()
+    analytics.stream_stats(columns)
+    print('  columns   {:.2f}s'.format(converted - start))
+    print('  stats     {:.2f}s'.format(time.perf_counter() - converted))
+
+    for stream_name, row in results['dict loop'].items():
+        other = results['vectorized'][stream_name]
+        assert row['rows'] == other['rows']
+        assert abs(row['latency_p95'] - other['latency_p95']) < 1e-6
+        assert abs(row['lag_p99'] - other['lag_p99']) < 1e-6
+    print('speedup     {:.1f}x'.format(timings['dict loop'] / timings['vectorized']))
+
+
+if __name__ == '__main__':
+    main()
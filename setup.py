@@ -20,6 +20,10 @@ setup(
          'python-dotenv',
          'requests-toolbelt'
      ],
+    extras_require={
+        'http2': ['httpx[http2,brotli]'],
+        'analytics': ['numpy'],
+    },
     entry_points={
         'console_scripts': [
             'stitchapi = stitch_api.cli:main',
@@ -0,0 +1,212 @@
+from typing import Any, Dict, Iterable, List, Optional
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# batch keys as returned by the loading-reports endpoint
+DEFAULT_FIELDS = {
+    'stream': 'stream_name',
+    'rows': 'row_count',
+    'received_at': 'received_at',
+    'started_at': 'started_at',
+    'completed_at': 'completed_at',
+}
+PERCENTILES = (50, 95, 99)
+
+LoadColumns = namedtuple('LoadColumns',
+                         'stream_names stream_idx rows received_at started_at completed_at')
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('Load analytics require numpy, '
+                          'install with: pip install python-stitch-data[analytics]')
+
+
+# byte offsets of the separators in YYYY-MM-DDTHH:MM:SS
+_SEPARATORS = {4: b'-', 7: b'-', 10: b'T', 13: b':', 16: b':'}
+_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+
+
+def _parse_fixed_width(values: List[Optional[str]]) -> Optional[Any]:
+    """
+    Parses uniform-width ISO timestamps (YYYY-MM-DDTHH:MM:SS[.fff][Z]) with integer
+    arithmetic on the raw bytes. Returns None if the values don't fit that shape
+    """
+    present = next((i for i in values if i), None)
+    if present is None:
+        return np.full(len(values), np.nan)
+    width = len(present)
+    # missing values are padded with an impossible month and masked after parsing
+    padding = '0000-00' + present[7:]
+    try:
+        raw = ''.join([i or padding for i in values]).encode('ascii')
+    except UnicodeEncodeError:
+        return None
+    if width < 19 or len(raw) != width * len(values):
+        return None
+    chars = np.frombuffer(raw, dtype=np.uint8).reshape(len(values), width)
+    for offset, separator in _SEPARATORS.items():
+        if not (chars[:, offset] == ord(separator)).all():
+            return None
+    end = width - 1 if present[-1] == 'Z' else width
+    if end > 19 and not (chars[:, 19] == ord('.')).all():
+        return None
+    digit_columns = _DIGITS + list(range(20, end))
+    digits = chars[:, digit_columns].astype('int64') - ord('0')
+    if ((digits < 0) | (digits > 9)).any():
+        return None
+
+    def number(start, stop):
+        return digits[:, start:stop] @ (10 ** np.arange(stop - start - 1, -1, -1))
+
+    year, month, day = number(0, 4), number(4, 6), number(6, 8)
+    months = (year - 1970) * 12 + (month - 1)
+    days = months.astype('datetime64[M]').astype('datetime64[D]').astype('int64') + (day - 1)
+    seconds = (days * 86400 + number(8, 10) * 3600 + number(10, 12) * 60
+               + number(12, 14)).astype('float64')
+    if end > 20:
+        seconds += number(14, 14 + end - 20) / 10.0 ** (end - 20)
+    seconds[month == 0] = np.nan
+    return seconds
+
+
+def _to_seconds(values: List[Optional[str]]) -> Any:
+    seconds = _parse_fixed_width(values)
+    if seconds is not None:
+        return seconds
+    # general case, datetime64 parsing handles mixed widths. NaT becomes NaN
+    timestamps = np.array([i[:-1] if i and i[-1] == 'Z' else i for i in values],
+                          dtype='datetime64[ms]')
+    seconds = timestamps.astype('int64').astype('float64') / 1000
+    seconds[np.isnat(timestamps)] = np.nan
+    return seconds
+
+
+def batches_to_columns(batches: Iterable[Dict[str, Any]],
+                       fields: Optional[Dict[str, str]] = None) -> LoadColumns:
+    """
+    Converts load report batches (list of dicts) into columnar arrays, one list
+    comprehension per column. timestamps are float epoch seconds, NaN when missing
+    """
+    _require_numpy()
+    fields = dict(DEFAULT_FIELDS, **(fields or {}))
+    batches = list(batches)
+    stream_ids = {}
+    stream_idx = [stream_ids.setdefault(i.get(fields['stream']), len(stream_ids)) for i in batches]
+    rows = [i.get(fields['rows']) or 0 for i in batches]
+    return LoadColumns(stream_names=np.array([str(i) for i in stream_ids], dtype=str),
+                       stream_idx=np.array(stream_idx, dtype='int64'),
+                       rows=np.array(rows, dtype='float64'),
+                       received_at=_to_seconds([i.get(fields['received_at']) for i in batches]),
+                       started_at=_to_seconds([i.get(fields['started_at']) for i in batches]),
+                       completed_at=_to_seconds([i.get(fields['completed_at']) for i in batches]))
+
+
+def grouped_percentiles(values: Any, groups: Any, n_groups: int,
+                        percentiles: Iterable[float] = PERCENTILES) -> Dict[float, Any]:
+    """
+    Linear-interpolated percentiles per group (same as np.percentile), NaN values are ignored
+    and empty groups yield NaN
+    """
+    _require_numpy()
+    valid = ~np.isnan(values)
+    values, groups = values[valid], groups[valid]
+    order = np.lexsort((values, groups))
+    values = values[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    empty = counts == 0
+    result = {}
+    for p in percentiles:
+        position = offsets + (p / 100.0) * np.maximum(counts - 1, 0)
+        lo = np.floor(position).astype('int64')
+        hi = np.ceil(position).astype('int64')
+        lo[empty] = hi[empty] = 0
+        if values.size:
+            weight = position - lo
+            result[p] = values[lo] * (1 - weight) + values[hi] * weight
+        else:
+            result[p] = np.full(n_groups, np.nan)
+        result[p][empty] = np.nan
+    return result
+
+
+def stream_stats(columns: LoadColumns,
+                 percentiles: Iterable[float] = PERCENTILES) -> List[Dict[str, Any]]:
+    """
+    Per stream totals, rows per minute, and load latency (completed - started) and
+    replication lag (completed - received) percentiles, in seconds
+    """
+    _require_numpy()
+    n_streams = len(columns.stream_names)
+    idx = columns.stream_idx
+    batches = np.bincount(idx, minlength=n_streams)
+    total_rows = np.bincount(idx, weights=columns.rows, minlength=n_streams)
+    first = np.full(n_streams, np.inf)
+    last = np.full(n_streams, -np.inf)
+    np.fmin.at(first, idx, columns.started_at)
+    np.fmax.at(last, idx, columns.completed_at)
+    minutes = (last - first) / 60
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rows_per_minute = np.where(minutes > 0, total_rows / minutes, np.nan)
+
+    latency = grouped_percentiles(columns.completed_at - columns.started_at, idx, n_streams,
+                                  percentiles)
+    lag = grouped_percentiles(columns.completed_at - columns.received_at, idx, n_streams,
+                              percentiles)
+    stats = []
+    for i, stream_name in enumerate(columns.stream_names):
+        row = {'stream_name': str(stream_name),
+               'batches': int(batches[i]),
+               'rows': int(total_rows[i]),
+               'rows_per_minute': float(rows_per_minute[i])}
+        for p in percentiles:
+            row['latency_p{}'.format(p)] = float(latency[p][i])
+            row['lag_p{}'.format(p)] = float(lag[p][i])
+        stats.append(row)
+    return stats
+
+
+def hourly_histogram(columns: LoadColumns) -> Dict[str, Any]:
+    """
+    Rows loaded per stream per hour (by completed_at)
+    returns {'hours': datetime64 hour buckets, 'streams': names, 'rows': streams x hours matrix}
+    """
+    _require_numpy()
+    n_streams = len(columns.stream_names)
+    valid = ~np.isnan(columns.completed_at)
+    hours = (columns.completed_at[valid] // 3600).astype('int64')
+    if not hours.size:
+        return {'hours': np.array([], dtype='datetime64[h]'), 'streams': columns.stream_names,
+                'rows': np.zeros((n_streams, 0))}
+    start = hours.min()
+    n_hours = int(hours.max() - start) + 1
+    flat = columns.stream_idx[valid] * n_hours + (hours - start)
+    matrix = np.bincount(flat, weights=columns.rows[valid], minlength=n_streams * n_hours)
+    return {'hours': (np.arange(n_hours) + start).astype('datetime64[h]'),
+            'streams': columns.stream_names,
+            'rows': matrix.reshape(n_streams, n_hours)}
+
+
+def detect_gaps(columns: LoadColumns, threshold_minutes: float = 60) -> List[Dict[str, Any]]:
+    """
+    Finds periods longer than threshold_minutes between consecutive completed loads of a stream
+    """
+    _require_numpy()
+    valid = ~np.isnan(columns.completed_at)
+    completed, idx = columns.completed_at[valid], columns.stream_idx[valid]
+    order = np.lexsort((completed, idx))
+    completed, idx = completed[order], idx[order]
+    deltas = np.diff(completed)
+    gap = (idx[1:] == idx[:-1]) & (deltas > threshold_minutes * 60)
+    positions = np.nonzero(gap)[0]
+    to_datetime = lambda x: np.datetime64(int(x * 1000), 'ms')  # noqa: E731
+    return [{'stream_name': str(columns.stream_names[idx[i]]),
+             'gap_start': to_datetime(completed[i]),
+             'gap_end': to_datetime(completed[i + 1]),
+             'minutes': float(deltas[i] / 60)} for i in positions]
@@ -1,7 +1,7 @@
 from datetime import datetime
 import json
 from collections import namedtuple
-from typing import Dict, Any
+from typing import Dict, Any, List
 from .common import BaseStitchApi
 
 
@@ -91,9 +91,13 @@ class Stream(BaseStitchApi):
                                 method='get')
 
     @classmethod
-    def update_metadata(cls, source_id: int, *args, **kwargs) -> namedtuple:
-        assert source_id
-        raise NotImplementedError
+    def update_metadata(cls, source_id: int, streams: List[Dict[str, Any]],
+                        *args, **kwargs) -> namedtuple:
+        """streams: [{'tap_stream_id': ..., 'metadata': [{'breadcrumb': [], 'metadata': {...}}]}]"""
+        assert all([source_id, streams])
+        payload = {'streams': streams}
+        return cls.send_request('/v4/sources/{}/streams/metadata'.format(source_id), method='put',
+                                payload=json.dumps(payload))
 
 
 class ReplicationJob(BaseStitchApi):
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import click
 import os
+from datetime import datetime, timedelta
 from stitch_api import StitchAPI
 import functools
 
@@ -10,6 +11,7 @@ STITCH_CLIENT_ID = os.getenv('STITCH_CLIENT_ID')
 STITCH_AUTH_USER = os.getenv('STITCH_AUTH_USER')
 STITCH_AUTH_PASSWORD = os.getenv('STITCH_AUTH_PASSWORD')
 STITCH_BLACKLIST_SOURCES = os.getenv('STITCH_BLACKLIST_SOURCES')
+STITCH_TRANSPORT = os.getenv('STITCH_TRANSPORT', 'requests')
 
 
 def provide_client(func):
@@ -19,9 +21,11 @@ def provide_client(func):
                                STITCH_CLIENT_ID,
                                STITCH_AUTH_USER,
                                STITCH_AUTH_PASSWORD,
-                               STITCH_BLACKLIST_SOURCES)
-        kwargs.update(stitch_api=stitch_api)
-        value = func(*args, **kwargs)
+                               STITCH_BLACKLIST_SOURCES,
+                               transport=STITCH_TRANSPORT)
+        with stitch_api:
+            kwargs.update(stitch_api=stitch_api)
+            value = func(*args, **kwargs)
         return value
     return wrapper_client_provider
 
@@ -87,6 +91,19 @@ def get_stream_schema(source, stream, stitch_api=None):
     print(stream)
 
 
+@cli1.command()
+@click.option('--source', multiple=True, required=True, help='Source name (repeatable)')
+@click.option('--pattern', default='*', help='Stream name glob pattern')
+@click.option('--deselect', is_flag=True, default=False, help='Deselect matching streams')
+@click.option('--fields', default=None, help='Comma separated list, select these fields only')
+@provide_client
+def select_streams(source, pattern, deselect, fields=None, stitch_api=None):
+    """Select or deselect streams (or fields) matching a pattern"""
+    response = stitch_api.select_streams_bulk({i: pattern for i in source}, selected=not deselect,
+                                              fields=fields.split(',') if fields else None)
+    print(response)
+
+
 @cli1.command()
 @click.option('--source', help='Source name')
 @click.option('--stream', help='Stream name')
@@ -142,6 +159,51 @@ def connection_check(source, stitch_api=None):
     print(response)
 
 
+@cli1.command()
+@click.option('--hours', default=24, help='Extraction history window in hours')
+@click.option('--workers', default=8, help='Concurrent requests')
+@provide_client
+def health_sweep(hours, workers, stitch_api=None):
+    """Connection check and last extraction status for all sources"""
+    rows = stitch_api.health_sweep(window_hours=hours, max_workers=workers)
+    columns = ['source_name', 'paused', 'check_status', 'last_extraction_exit_status',
+               'last_extraction_duration', 'staleness', 'stale_beyond_window',
+               'check_error', 'extraction_error']
+    print('\t'.join(columns))
+    for row in rows:
+        print('\t'.join(str(row[i]) for i in columns))
+
+
+@cli1.command()
+@click.option('--source', help='Source name')
+@click.option('--days', default=1, help='Days of load history')
+@click.option('--selected_only', default=False, help='Only selected streams')
+@click.option('--gap-minutes', default=60, help='Report gaps between loads longer than this')
+@provide_client
+def load_stats(source, days, selected_only, gap_minutes, stitch_api=None):
+    """Per stream load throughput, latency and lag percentiles"""
+    end_datetime = datetime.utcnow()
+    stats = stitch_api.get_source_load_stats(source, end_datetime - timedelta(days=days), end_datetime,
+                                             selected_only=selected_only, gap_minutes=gap_minutes)
+    for row in stats['streams']:
+        print(row)
+    for gap in stats['gaps']:
+        print(gap)
+
+
+@cli1.command()
+@click.option('--active-interval', default=30, help='Seconds between polls of a running source')
+@click.option('--idle-interval', default=600, help='Seconds between polls of an idle source')
+@click.option('--check-interval', default=900, help='Seconds between connection check polls')
+@provide_client
+def watch(active_interval, idle_interval, check_interval, stitch_api=None):
+    """Print source change events as they happen"""
+    watcher = stitch_api.watch(active_interval=active_interval, idle_interval=idle_interval,
+                               check_interval=check_interval)
+    for event in watcher.events():
+        print(event)
+
+
 @cli1.command()
 @click.option('--source', help='Source name')
 @provide_client
@@ -4,3 +4,8 @@ DEVICE_SETTINGS = {'user_agent': ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_14_
                                   'Chrome/73.0.3683.86 Safari/537.36')
                    }
 MAX_REPORT_DAYS = 60
+# max streams per /streams/metadata request
+METADATA_BATCH_SIZE = 100
+MAX_WORKERS = 8
+MAX_CONNECTIONS = 10
+LOAD_PAGE_SIZE = 100
@@ -1,13 +1,18 @@
-from typing import Any, Callable, Dict, List, Optional
-from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from fnmatch import fnmatch
 import functools
 import logging
 from collections import defaultdict
-from requests_toolbelt import sessions
 from stitch_api import constants
 from stitch_api import api
+from stitch_api import analytics
 from dotenv import load_dotenv
-from .constants import MAX_REPORT_DAYS
+from .constants import MAX_REPORT_DAYS, METADATA_BATCH_SIZE, MAX_WORKERS, MAX_CONNECTIONS, \
+    LOAD_PAGE_SIZE
+from .watch import Watcher
+from .transport import assert_status_hook, accept_encoding, get_transport  # noqa: F401
 
 load_dotenv()
 
@@ -16,10 +21,6 @@ logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 
-def assert_status_hook(response, *args, **kwargs):
-    return response.raise_for_status()
-
-
 def internal_login_required(func):
     @functools.wraps(func)
     def wrapper_client_provider(*args, **kwargs):
@@ -49,7 +50,7 @@ class WriteBlacklist:
     def verify_request(self, source_id: int, stream_id: int):
         if source_id in self.source_entries:
             raise ValueError('Source {} has been blacklisted from writes'.format(source_id))
-        if stream_id in self.stream_entries:
+        if source_id in self.stream_entries:
             if stream_id in self.stream_entries[source_id]:
                 raise ValueError('Stream {} ({}) has been blacklisted from writes'.format(stream_id,
                                                                                           source_id))
@@ -63,26 +64,40 @@ class StitchAPI:
                  stitch_auth_user: str,
                  stitch_auth_password: str,
                  stitch_blacklist_sources: str = None,
+                 transport: str = 'requests',
+                 max_connections: int = MAX_CONNECTIONS,
+                 timeout: Optional[float] = None,
                  ) -> None:
         self.stitch_api_key = stitch_api_key
         self.stitch_client_id = stitch_client_id
         self.stitch_auth_user = stitch_auth_user
         self.stitch_auth_password = stitch_auth_password
 
-        self.client = sessions.BaseUrlSession(base_url=constants.API_URL)
-        self.client.hooks["response"] = [assert_status_hook]
+        self.client = get_transport(transport, constants.API_URL, max_connections=max_connections,
+                                    timeout=timeout)
 
         self.headers = {
                         'Accept': 'application/json',
                         'Origin': 'https://app.stitchdata.com',
                         'User-Agent': constants.DEVICE_SETTINGS['user_agent'],
                         'Content-Type': 'application/json',
+                        'Accept-Encoding': accept_encoding(),
                         'Authorization': 'Bearer %s' % stitch_api_key
         }
         self._logged_in_internal = False
         self.write_blacklist = None
         self._parse_blacklist_config(stitch_blacklist_sources)
 
+    def close(self) -> None:
+        """Closes the transport's connections (and the HTTP/2 event loop thread)"""
+        self.client.close()
+
+    def __enter__(self) -> 'StitchAPI':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
     def _parse_blacklist_config(self, config_string: str) -> bool:
         if not config_string:
             self.write_blacklist = None
@@ -91,10 +106,10 @@ class StitchAPI:
         stream_entries = defaultdict(list)
         source_entries = []
         for entry in entries:
-            source_name, stream_name = entry.split(".") + [None]
+            source_name, stream_name = (entry.split(".", 1) + [None])[:2]
             source_id = self.get_source_from_name(source_name)['id']
             if stream_name:
-                stream_id = self.get_stream_from_name(stream_name)['stream_id']
+                stream_id = self.get_stream_from_name(source_name, stream_name)['stream_id']
                 stream_entries[source_id].append(stream_id)
             else:
                 source_entries.append(source_id)
@@ -107,7 +122,8 @@ class StitchAPI:
         logger.debug('Authenticating internal API')
         data = '{{"email":"{user}","password":"{password}","remember-me":false}}'\
             .format(user=stitch_auth_user, password=stitch_auth_password)
-        _ = self.client.post('/session', headers=self.headers, data=data)
+        _ = self.client.request('post', '/session', headers=self.headers, data=data)
+        self._logged_in_internal = True
         return True
 
     def _execute_request(self, api_call: Callable, return_json: bool = False, *args, **kwargs) -> Any:
@@ -116,10 +132,9 @@ class StitchAPI:
             self.write_blacklist.verify_request(source_id=kwargs.get('source_id'),
                                                 stream_id=kwargs.get('stream_id'))
         send_request = api_call(*args, **kwargs)
-        func = getattr(self.client, send_request.method)
-        response = func(send_request.endpoint,
-                        headers=self.headers,
-                        data=send_request.payload)
+        response = self.client.request(send_request.method, send_request.endpoint,
+                                       headers=self.headers,
+                                       data=send_request.payload)
         if return_json:
             return response.json()
         return {'STATUS': response.status_code}
@@ -186,6 +201,110 @@ class StitchAPI:
                                          stream_id=stream_id, return_json=True, *args, **kwargs)
         return response
 
+    def update_streams_metadata(self, source_id: int,
+                                changes: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]],
+                                *args, **kwargs) -> List[Any]:
+        """
+        changes: [(stream, [{'breadcrumb': [...], 'metadata': {...}}, ...]), ...]
+        streams are batched into as few /streams/metadata requests as the API allows
+        """
+        if self.write_blacklist:
+            for stream, _ in changes:
+                self.write_blacklist.verify_request(source_id=source_id, stream_id=stream['stream_id'])
+        entries = [{'tap_stream_id': stream['tap_stream_id'], 'metadata': metadata}
+                   for stream, metadata in changes]
+        responses = []
+        for i in range(0, len(entries), METADATA_BATCH_SIZE):
+            response = self._execute_request(api.Stream.update_metadata, source_id=source_id,
+                                             streams=entries[i:i + METADATA_BATCH_SIZE], *args, **kwargs)
+            responses.append(response)
+        return responses
+
+    @read_only
+    def _plan_stream_selection(self, source_id: int, pattern: str = '*', selected: bool = True,
+                               fields: Optional[List[str]] = None, max_workers: int = MAX_WORKERS,
+                               *args, **kwargs) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        # only streams (or fields) whose selection actually changes
+        streams = [i for i in self._list_streams(source_id) if fnmatch(i['stream_name'], pattern)]
+        if not fields:
+            return [(i, [{'breadcrumb': [], 'metadata': {'selected': selected}}]) for i in streams
+                    if bool(i.get('selected')) != selected]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            schemas = list(executor.map(lambda x: self.get_stream_schema(source_id, x['stream_id']),
+                                        streams))
+        changes = []
+        for stream, schema in zip(streams, schemas):
+            metadata = [{'breadcrumb': i['breadcrumb'], 'metadata': {'selected': selected}}
+                        for i in schema.get('metadata', [])
+                        if len(i['breadcrumb']) == 2 and i['breadcrumb'][0] == 'properties'
+                        and i['breadcrumb'][1] in fields
+                        and bool(i['metadata'].get('selected')) != selected]
+            if metadata:
+                changes.append((stream, metadata))
+        return changes
+
+    def select_streams(self, source_name: str, pattern: str = '*', selected: bool = True,
+                       fields: Optional[List[str]] = None, *args, **kwargs) -> List[Any]:
+        """examples:
+                   select_streams('postgres', pattern='public-*')
+                   select_streams('postgres', pattern='*_archive', selected=False)
+                   select_streams('postgres', pattern='public-users', fields=['email'], selected=False)
+
+        with fields, only those properties of the matching streams are (de)selected
+        """
+        source = self.get_source_from_name(source_name)
+        changes = self._plan_stream_selection(source['id'], pattern, selected, fields)
+        if not changes:
+            return []
+        return self.update_streams_metadata(source['id'], changes, *args, **kwargs)
+
+    def _select_source_streams(self, source_id: int,
+                               changes: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]
+                               ) -> Dict[str, Any]:
+        result = {'streams': [i['stream_name'] for i, _ in changes], 'responses': [], 'error': None}
+        if not changes:
+            return result
+        try:
+            result['responses'] = self.update_streams_metadata(source_id, changes)
+        except Exception as e:
+            logger.warning('Stream selection failed for source {}: {}'.format(source_id, e))
+            result['error'] = str(e)
+        return result
+
+    def select_streams_bulk(self, patterns: Dict[str, str], selected: bool = True,
+                            fields: Optional[List[str]] = None, max_workers: int = MAX_WORKERS,
+                            *args, **kwargs) -> Dict[str, Dict[str, Any]]:
+        """
+        Selects (or deselects) streams matching a pattern for many sources concurrently
+        patterns: {source_name: stream_name_pattern}
+        fields: optional property names, (de)selects those fields instead of whole streams
+        returns {source_name: {'streams': [...], 'responses': [...], 'error': None or str}}
+
+        Every planned write is checked against the blacklist before anything is
+        written, a failing source afterwards doesn't stop the others
+        """
+        sources = {i['name']: i for i in self.list_sources()}
+        missing = [i for i in patterns if i not in sources]
+        if missing:
+            raise ValueError('No matching source found for "{}"'.format('", "'.join(missing)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {name: executor.submit(self._plan_stream_selection, sources[name]['id'],
+                                             pattern, selected, fields)
+                       for name, pattern in patterns.items()}
+            plans = {name: future.result() for name, future in futures.items()}
+
+        if self.write_blacklist:
+            for name, changes in plans.items():
+                for stream, _ in changes:
+                    self.write_blacklist.verify_request(source_id=sources[name]['id'],
+                                                        stream_id=stream['stream_id'])
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {name: executor.submit(self._select_source_streams, sources[name]['id'],
+                                             changes)
+                       for name, changes in plans.items()}
+            return {name: future.result() for name, future in futures.items()}
+
     @internal_login_required
     def _reset_stream(self, source_id: int, stream_id: int, *args, **kwargs) -> Any:
         response = self._execute_request(api.Stream.reset, source_id=source_id, stream_id=stream_id,
@@ -272,12 +391,26 @@ class StitchAPI:
             date_list[-1] = end_datetime
         reports = []
         for start, end in zip(date_list, date_list[1:]):
-            report = self.get_loads('', stream_name=stream_name, limit=100, offset=0,
-                                    time_range_start=start, time_range_end=end,
-                                    source_id=source_id)
-            reports.extend(report['batches'])
+            reports.extend(self._get_all_loads(source_id, stream_name, start, end))
         return reports
 
+    def _get_all_loads(self, source_id: int, stream_name: str,
+                       start_datetime: datetime, end_datetime: datetime,
+                       limit: int = LOAD_PAGE_SIZE) -> List[Dict[str, Any]]:
+        """
+        Pages through get_loads until a short page
+        """
+        batches = []
+        offset = 0
+        while True:
+            page = self.get_loads('', stream_name=stream_name, limit=limit, offset=offset,
+                                  time_range_start=start_datetime, time_range_end=end_datetime,
+                                  source_id=source_id)['batches']
+            batches.extend(page)
+            if len(page) < limit:
+                return batches
+            offset += limit
+
     def get_stream_load_reports(self, source_id: int, stream_name: str,
                                 start_datetime: datetime, end_datetime: datetime):
         # stitch has limited history
@@ -290,26 +423,53 @@ class StitchAPI:
             reports = self.get_multiday_load_reports(source_id, stream_name, start_datetime,
                                                      end_datetime)
         else:
-            reports = self.get_loads('', stream_name=stream_name, limit=100, offset=0,
-                                     time_range_start=start_datetime, time_range_end=end_datetime,
-                                     source_id=source_id)['batches']
+            reports = self._get_all_loads(source_id, stream_name, start_datetime, end_datetime)
         return reports
 
     def get_source_load_reports(self, source_id: int,
                                 start_datetime: datetime, end_datetime: datetime,
-                                selected_only: bool = False):
-        reports = []
+                                selected_only: bool = False, max_workers: int = MAX_WORKERS):
+        """
+        Load reports for every stream of a source, streams are fetched concurrently
+        """
         streams = self._list_streams(source_id=source_id)
-        for stream in streams:
-            if selected_only and not stream['selected']:
-                continue
+        if selected_only:
+            streams = [i for i in streams if i['selected']]
+        # log in once up front rather than racing a login per worker
+        if streams and not self._logged_in_internal:
+            self._login(self.stitch_auth_user, self.stitch_auth_password)
+
+        def stream_load_reports(stream):
             report = self.get_stream_load_reports(source_id=source_id,
                                                   stream_name=stream['stream_name'],
                                                   start_datetime=start_datetime,
                                                   end_datetime=end_datetime)
-            reports.extend(report)
+            for batch in report:
+                batch.setdefault('stream_name', stream['stream_name'])
+            return report
+
+        reports = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for report in executor.map(stream_load_reports, streams):
+                reports.extend(report)
         return reports
 
+    def get_source_load_stats(self, source_name: str,
+                              start_datetime: datetime, end_datetime: datetime,
+                              selected_only: bool = False, gap_minutes: float = 60,
+                              fields: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Per stream throughput, latency and lag percentiles, hourly row histogram and gaps
+        between loads, see stitch_api.analytics
+        """
+        source = self.get_source_from_name(source_name)
+        batches = self.get_source_load_reports(source['id'], start_datetime, end_datetime,
+                                               selected_only=selected_only)
+        columns = analytics.batches_to_columns(batches, fields=fields)
+        return {'streams': analytics.stream_stats(columns),
+                'hourly': analytics.hourly_histogram(columns),
+                'gaps': analytics.detect_gaps(columns, threshold_minutes=gap_minutes)}
+
     @read_only
     @internal_login_required
     def get_loads(self, source_name: str, stream_name: str, limit: int, offset: int,
@@ -336,7 +496,7 @@ class StitchAPI:
     @internal_login_required
     def get_extractions(self, time_range_start: datetime, time_range_end: datetime,
                         source_id: Optional[int] = None, source_name: Optional[str] = None,
-                        *args, **kwargs) -> Any:
+                        *args, **kwargs) -> List[Dict[str, Any]]:
 
         if not source_id:
             source = self.get_source_from_name(source_name)
@@ -352,13 +512,96 @@ class StitchAPI:
                                          end_iso=time_end,
                                          client_id=self.stitch_client_id,
                                          return_json=True, *args, **kwargs)
+        # the jobs endpoint takes no paging parameters, the time range bounds the result,
+        # which comes back either as a bare list or wrapped in {'data': [...]}
+        if isinstance(response, dict):
+            return response.get('data', [])
+        return response
+
+    @read_only
+    def get_connection_check(self, source_id: int, *args, **kwargs) -> Dict[str, Any]:
+        response = self._execute_request(api.ConnectionCheck.get, source_id=source_id,
+                                         return_json=True, *args, **kwargs)
         return response
 
     @read_only
     def source_connection_check(self, source_name: str, *args, **kwargs) -> Any:
         source = self.get_source_from_name(source_name)
-        self._execute_request(api.ConnectionCheck.get, source_id=source['id'], return_json=True,
-                              *args, **kwargs)
+        return self.get_connection_check(source['id'], *args, **kwargs)
+
+    @classmethod
+    def _parse_timestamp(cls, value: Optional[str]) -> Optional[datetime]:
+        if not value:
+            return None
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        # stitch timestamps are UTC, treat the ones without an offset as such
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed
+
+    def _source_health(self, source: Dict[str, Any], time_range_start: datetime,
+                       time_range_end: datetime) -> Dict[str, Any]:
+        row = {'source_id': source['id'],
+               'source_name': source['name'],
+               'paused': bool(source.get('paused_at')),
+               'check_status': None,
+               'last_extraction_exit_status': None,
+               'last_extraction_duration': None,
+               'staleness': None,
+               'stale_beyond_window': False,
+               'check_error': None,
+               'extraction_error': None}
+        try:
+            check = self.get_connection_check(source['id'])
+            row['check_status'] = check.get('status')
+        except Exception as e:
+            logger.warning('Connection check failed for {}: {}'.format(source['name'], e))
+            row['check_error'] = str(e)
+        try:
+            extractions = self.get_extractions(time_range_start, time_range_end, source_id=source['id'])
+        except Exception as e:
+            logger.warning('Extraction lookup failed for {}: {}'.format(source['name'], e))
+            row['extraction_error'] = str(e)
+            return row
+        completed = [i for i in extractions if i.get('completion_time')]
+        if not completed:
+            # nothing finished inside the window, staleness is at least the window
+            row['staleness'] = (time_range_end - time_range_start).total_seconds()
+            row['stale_beyond_window'] = True
+            return row
+        # a malformed job only fails this source, not the whole sweep
+        try:
+            last = max(completed, key=lambda x: self._parse_timestamp(x['completion_time']))
+            start_time = self._parse_timestamp(last.get('start_time'))
+            completion_time = self._parse_timestamp(last['completion_time'])
+            row['last_extraction_exit_status'] = last.get('tap_exit_status')
+            if start_time:
+                row['last_extraction_duration'] = (completion_time - start_time).total_seconds()
+            row['staleness'] = (datetime.now(timezone.utc) - completion_time).total_seconds()
+        except Exception as e:
+            logger.warning('Extraction summary failed for {}: {}'.format(source['name'], e))
+            row['extraction_error'] = str(e)
+        return row
+
+    @read_only
+    def health_sweep(self, window_hours: int = 24, max_workers: int = MAX_WORKERS,
+                     *args, **kwargs) -> List[Dict[str, Any]]:
+        """
+        Lists sources once then fetches the last connection check and recent
+        extractions for every source concurrently.
+        durations and staleness are in seconds, sources without a completed extraction
+        in the window report the window as staleness with stale_beyond_window=True
+        """
+        sources = self.list_sources()
+        time_range_end = datetime.utcnow()
+        time_range_start = time_range_end - timedelta(hours=window_hours)
+        # log in once up front rather than racing a login per worker
+        if not self._logged_in_internal:
+            self._login(self.stitch_auth_user, self.stitch_auth_password)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            rows = executor.map(lambda x: self._source_health(x, time_range_start, time_range_end),
+                                sources)
+            return list(rows)
 
     def start_repliction(self, source_name: str, *args, **kwargs) -> Any:
         source = self.get_source_from_name(source_name)
@@ -368,9 +611,18 @@ class StitchAPI:
         source = self.get_source_from_name(source_name)
         self._execute_request(api.ReplicationJob.stop, source_id=source['id'], *args, **kwargs)
 
+    @read_only
     @internal_login_required
-    def get_source_daily_report(self, source_name: str, *args, **kwargs) -> Any:
-        source = self.get_source_from_name(source_name)
+    def get_daily_report(self, *args, **kwargs) -> List[Dict[str, Any]]:
+        """Daily stats for every source, one request"""
         daily_stats = self._execute_request(api.Source.daily_report, client_id=self.stitch_client_id,
                                             return_json=True, *args, **kwargs)
-        return [i for i in daily_stats['stats'] if i['connection_id'] == source['id']]
+        return daily_stats['stats']
+
+    def get_source_daily_report(self, source_name: str, *args, **kwargs) -> Any:
+        source = self.get_source_from_name(source_name)
+        return [i for i in self.get_daily_report(*args, **kwargs) if i['connection_id'] == source['id']]
+
+    def watch(self, *args, **kwargs) -> Watcher:
+        """Change-driven monitor with adaptive polling, see stitch_api.watch.Watcher"""
+        return Watcher(self, *args, **kwargs)
@@ -0,0 +1,126 @@
+from typing import Any, Optional
+import asyncio
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from requests_toolbelt import sessions
+from .constants import MAX_CONNECTIONS
+
+
+def assert_status_hook(response, *args, **kwargs):
+    return response.raise_for_status()
+
+
+def _brotli_available() -> bool:
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+        except ImportError:
+            return False
+    return True
+
+
+def accept_encoding() -> str:
+    # only advertise br when the installed client can actually decode it
+    if _brotli_available():
+        return 'gzip, deflate, br'
+    return 'gzip, deflate'
+
+
+class RequestsTransport:
+    """HTTP/1.1 transport backed by a requests_toolbelt BaseUrlSession"""
+
+    def __init__(self, base_url: str, max_connections: int = MAX_CONNECTIONS,
+                 timeout: Optional[float] = None) -> None:
+        self.timeout = timeout
+        self.client = sessions.BaseUrlSession(base_url=base_url)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.client.mount('https://', adapter)
+        self.client.mount('http://', adapter)
+        self.client.hooks["response"] = [assert_status_hook]
+
+    def request(self, method: str, endpoint: str, headers: dict, data: Optional[str] = None) -> Any:
+        func = getattr(self.client, method)
+        return func(endpoint, headers=headers, data=data, timeout=self.timeout)
+
+    def close(self) -> None:
+        self.client.close()
+
+
+async def _raise_requests_error(response):
+    # keep callers on requests' exception types regardless of transport
+    if response.is_error:
+        await response.aread()
+        raise requests.HTTPError('{} Error: {} for url: {}'.format(response.status_code,
+                                                                   response.reason_phrase,
+                                                                   response.url),
+                                 response=response)
+
+
+class HTTP2Transport:
+    """
+    HTTP/2 transport backed by httpx, concurrent requests are multiplexed
+    over a small number of connections. Errors are raised as requests exceptions
+    (HTTPError, Timeout, ConnectionError) so the transport stays interchangeable,
+    HTTPError.response is the httpx response.
+
+    httpx's sync HTTP/2 connections aren't safe to share between threads, so an
+    AsyncClient runs on a private event loop thread and request() blocks on it.
+
+    http1=False skips HTTP/1.1 negotiation (h2 prior knowledge, e.g. for cleartext h2c)
+    timeout is in seconds, None (the default, same as requests) waits indefinitely
+    """
+
+    def __init__(self, base_url: str, max_connections: int = MAX_CONNECTIONS,
+                 timeout: Optional[float] = None, http1: bool = True) -> None:
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError('HTTP/2 transport requires httpx, '
+                              'install with: pip install python-stitch-data[http2]')
+        self.httpx = httpx
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='stitch-http2', daemon=True)
+        self._thread.start()
+        limits = httpx.Limits(max_connections=max_connections,
+                              max_keepalive_connections=max_connections)
+
+        async def create_client():
+            return httpx.AsyncClient(base_url=base_url, http1=http1, http2=True, limits=limits,
+                                     timeout=timeout,
+                                     event_hooks={'response': [_raise_requests_error]})
+        self.client = self._run(create_client())
+
+    def _run(self, coroutine) -> Any:
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def request(self, method: str, endpoint: str, headers: dict, data: Optional[str] = None) -> Any:
+        try:
+            return self._run(self.client.request(method.upper(), endpoint, headers=headers,
+                                                 content=data))
+        except self.httpx.TimeoutException as e:
+            raise requests.Timeout(str(e)) from e
+        except self.httpx.TransportError as e:
+            raise requests.ConnectionError(str(e)) from e
+
+    def close(self) -> None:
+        if not self._thread.is_alive():
+            return
+        self._run(self.client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+TRANSPORTS = {
+    'requests': RequestsTransport,
+    'http2': HTTP2Transport,
+}
+
+
+def get_transport(name: str, base_url: str, max_connections: int = MAX_CONNECTIONS,
+                  timeout: Optional[float] = None) -> Any:
+    if name not in TRANSPORTS:
+        raise ValueError('Unknown transport "{}", expected one of {}'.format(name, list(TRANSPORTS)))
+    return TRANSPORTS[name](base_url, max_connections=max_connections, timeout=timeout)
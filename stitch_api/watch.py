@@ -0,0 +1,238 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+Event = namedtuple('Event', 'type source_id source_name timestamp data')
+
+SOURCE_ADDED = 'source_added'
+SOURCE_REMOVED = 'source_removed'
+SCHEDULE_CHANGED = 'schedule_changed'
+PAUSED = 'paused'
+UNPAUSED = 'unpaused'
+SYNC_STARTED = 'sync_started'
+SYNC_FINISHED = 'sync_finished'
+CONNECTION_CHECK_FAILED = 'connection_check_failed'
+CONNECTION_CHECK_RECOVERED = 'connection_check_recovered'
+DAILY_REPORT_CHANGED = 'daily_report_changed'
+
+
+class SourceState:
+
+    def __init__(self, source: Dict[str, Any]) -> None:
+        self.source = source
+        self.running = False
+        self.last_start = None
+        self.check_status = None
+        # last failed/succeeded check, 'running' in between doesn't change it
+        self.check_result = None
+        self.daily_report = None
+        self.next_extraction_poll = 0.0
+        self.next_check_poll = 0.0
+        # polls that have established a baseline, changes are only reported after that
+        self.primed = set()
+
+    @property
+    def paused(self) -> bool:
+        return bool(self.source.get('paused_at'))
+
+
+class Watcher:
+    """
+    Polls Stitch and emits only changes. The source list (one request) drives
+    pause/schedule events, extractions are polled every active_interval seconds
+    for sources with a running sync and every idle_interval seconds otherwise.
+    Paused sources are not polled for extractions.
+
+    examples:
+               for event in Watcher(stitch).events():
+                   print(event)
+
+               watcher = Watcher(stitch)
+               watcher.on(SYNC_FINISHED, notify)
+               watcher.run()
+    """
+
+    def __init__(self, stitch_api: Any,
+                 active_interval: float = 30,
+                 idle_interval: float = 600,
+                 sources_interval: float = 60,
+                 check_interval: float = 900,
+                 report_interval: float = 3600,
+                 retry_interval: float = 60,
+                 extraction_window: timedelta = timedelta(hours=24),
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        self.stitch_api = stitch_api
+        self.active_interval = active_interval
+        self.idle_interval = idle_interval
+        self.sources_interval = sources_interval
+        self.check_interval = check_interval
+        self.report_interval = report_interval
+        self.retry_interval = retry_interval
+        self.extraction_window = extraction_window
+        self.clock = clock
+        self.sleep = sleep
+
+        self.sources = {}  # type: Dict[int, SourceState]
+        self.callbacks = defaultdict(list)  # type: Dict[str, List[Callable[[Event], Any]]]
+        self.next_sources_poll = 0.0
+        self.next_report_poll = 0.0
+        self._primed = False
+
+    def on(self, event_type: str, callback: Callable[[Event], Any]) -> None:
+        """Register a callback for an event type, '*' for all events"""
+        self.callbacks[event_type].append(callback)
+
+    def _event(self, event_type: str, state: SourceState, **data) -> Event:
+        return Event(event_type, state.source['id'], state.source['name'], datetime.utcnow(), data)
+
+    def _poll_sources(self) -> List[Event]:
+        events = []
+        sources = {i['id']: i for i in self.stitch_api.list_sources()}
+        for source_id in list(self.sources):
+            if source_id not in sources:
+                events.append(self._event(SOURCE_REMOVED, self.sources.pop(source_id)))
+        for source_id, source in sources.items():
+            state = self.sources.get(source_id)
+            if state is None:
+                state = self.sources[source_id] = SourceState(source)
+                if self._primed:
+                    events.append(self._event(SOURCE_ADDED, state))
+                continue
+            previous, state.source = state.source, source
+            if previous.get('schedule') != source.get('schedule'):
+                events.append(self._event(SCHEDULE_CHANGED, state, previous=previous.get('schedule'),
+                                          current=source.get('schedule')))
+            if bool(previous.get('paused_at')) != bool(source.get('paused_at')):
+                events.append(self._event(PAUSED if source.get('paused_at') else UNPAUSED, state))
+        self._primed = True
+        return events
+
+    def _sync_finished(self, state: SourceState, job: Dict[str, Any]) -> Event:
+        return self._event(SYNC_FINISHED, state, start_time=job['start_time'],
+                           completion_time=job['completion_time'],
+                           tap_exit_status=job.get('tap_exit_status'),
+                           target_exit_status=job.get('target_exit_status'))
+
+    def _poll_extractions(self, state: SourceState) -> List[Event]:
+        time_range_end = datetime.utcnow()
+        time_range_start = time_range_end - self.extraction_window
+        if state.running:
+            # keep a long running sync in view until it finishes
+            started = datetime.strptime(state.last_start[:19], '%Y-%m-%dT%H:%M:%S')
+            time_range_start = min(time_range_start, started)
+        jobs = self.stitch_api.get_extractions(time_range_start, time_range_end,
+                                               source_id=state.source['id'])
+        jobs = sorted((i for i in jobs if i.get('start_time')), key=lambda x: x['start_time'])
+        if not jobs:
+            # nothing to track, don't keep polling at active_interval
+            state.running = False
+            state.primed.add('extractions')
+            return []
+        latest = jobs[-1]
+        running = not latest.get('completion_time')
+        new = latest['start_time'] != state.last_start
+        events = []
+        if 'extractions' in state.primed:
+            if state.running and new:
+                # the sync we saw running finished before the next one started
+                previous = [i for i in jobs if i['start_time'] == state.last_start]
+                if previous and previous[0].get('completion_time'):
+                    events.append(self._sync_finished(state, previous[0]))
+            if new:
+                events.append(self._event(SYNC_STARTED, state, start_time=latest['start_time']))
+            # a sync may have started and finished between polls
+            if not running and (state.running or new):
+                events.append(self._sync_finished(state, latest))
+        state.last_start = latest['start_time']
+        state.running = running
+        state.primed.add('extractions')
+        return events
+
+    def _poll_connection_check(self, state: SourceState) -> List[Event]:
+        check = self.stitch_api.get_connection_check(state.source['id'])
+        state.check_status = check.get('status')
+        if state.check_status not in ('failed', 'succeeded'):
+            return []
+        previous, state.check_result = state.check_result, state.check_status
+        if 'check' not in state.primed or previous == state.check_result:
+            state.primed.add('check')
+            return []
+        if state.check_result == 'failed':
+            return [self._event(CONNECTION_CHECK_FAILED, state, error=check.get('error'))]
+        return [self._event(CONNECTION_CHECK_RECOVERED, state)]
+
+    def _poll_daily_report(self) -> List[Event]:
+        # one request covers every source, unlike get_source_daily_report
+        stats = defaultdict(list)
+        for entry in self.stitch_api.get_daily_report():
+            stats[entry['connection_id']].append(entry)
+        events = []
+        for source_id, state in self.sources.items():
+            previous, state.daily_report = state.daily_report, stats.get(source_id, [])
+            if 'report' in state.primed and previous != state.daily_report:
+                events.append(self._event(DAILY_REPORT_CHANGED, state, stats=state.daily_report))
+            state.primed.add('report')
+        return events
+
+    def _guarded(self, events: List[Event], poll: Callable[..., List[Event]], *args) -> bool:
+        try:
+            events.extend(poll(*args))
+            return True
+        except Exception as e:
+            logger.warning('{} failed: {}'.format(poll.__name__, e))
+            return False
+
+    def _next_poll(self, now: float, interval: float, succeeded: bool) -> float:
+        # failed polls are retried sooner rather than waiting out a long interval
+        return now + (interval if succeeded else min(interval, self.retry_interval))
+
+    def poll(self) -> List[Event]:
+        """Runs every poll that is due and returns (and dispatches) the resulting events"""
+        now = self.clock()
+        events = []
+        if now >= self.next_sources_poll:
+            succeeded = self._guarded(events, self._poll_sources)
+            self.next_sources_poll = self._next_poll(now, self.sources_interval, succeeded)
+        for state in list(self.sources.values()):
+            if not state.paused and now >= state.next_extraction_poll:
+                succeeded = self._guarded(events, self._poll_extractions, state)
+                interval = self.active_interval if state.running else self.idle_interval
+                state.next_extraction_poll = self._next_poll(now, interval, succeeded)
+            if not state.paused and now >= state.next_check_poll:
+                succeeded = self._guarded(events, self._poll_connection_check, state)
+                state.next_check_poll = self._next_poll(now, self.check_interval, succeeded)
+        if now >= self.next_report_poll:
+            succeeded = self._guarded(events, self._poll_daily_report)
+            self.next_report_poll = self._next_poll(now, self.report_interval, succeeded)
+
+        for event in events:
+            for callback in self.callbacks[event.type] + self.callbacks['*']:
+                callback(event)
+        return events
+
+    def _next_due(self) -> float:
+        due = [self.next_sources_poll, self.next_report_poll]
+        for state in self.sources.values():
+            if not state.paused:
+                due.extend([state.next_extraction_poll, state.next_check_poll])
+        return min(due)
+
+    def events(self, max_polls: Optional[int] = None) -> Iterator[Event]:
+        """Yields change events forever (or for max_polls polls)"""
+        polls = 0
+        while max_polls is None or polls < max_polls:
+            for event in self.poll():
+                yield event
+            polls += 1
+            self.sleep(max(self._next_due() - self.clock(), 1))
+
+    def run(self, max_polls: Optional[int] = None) -> None:
+        """Polls forever, events are only delivered to registered callbacks"""
+        for _ in self.events(max_polls=max_polls):
+            pass
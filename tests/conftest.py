@@ -0,0 +1,49 @@
+import json
+import re
+import pytest
+from stitch_api import StitchAPI
+
+
+class FakeResponse:
+
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+
+    def json(self):
+        return self.data
+
+
+class FakeClient:
+    """Stands in for a transport, routes are (method, endpoint regex, handler(match, payload))"""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.requests = []
+
+    def request(self, method, endpoint, headers, data=None):
+        self.requests.append((method, endpoint, data))
+        for route_method, pattern, handler in self.routes:
+            match = re.search(pattern, endpoint)
+            if route_method == method and match:
+                payload = json.loads(data) if data and endpoint != '/session' else data
+                return FakeResponse(handler(match, payload))
+        raise AssertionError('Unexpected request {} {}'.format(method, endpoint))
+
+    def count(self, method, pattern):
+        return len([i for i in self.requests if i[0] == method and re.search(pattern, i[1])])
+
+
+def login_route():
+    return ('post', r'^/session$', lambda match, payload: {})
+
+
+@pytest.fixture
+def make_api():
+    def _make_api(routes, blacklist=None):
+        stitch = StitchAPI('key', 1234, 'user', 'password')
+        stitch.close()
+        stitch.client = FakeClient(routes + [login_route()])
+        stitch._parse_blacklist_config(blacklist)
+        return stitch
+    return _make_api
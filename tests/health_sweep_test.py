@@ -0,0 +1,61 @@
+SOURCES = [{'id': 1, 'name': 'ok', 'deleted_at': None, 'paused_at': None},
+           {'id': 2, 'name': 'no_check', 'deleted_at': None, 'paused_at': None},
+           {'id': 3, 'name': 'stale', 'deleted_at': None, 'paused_at': None}]
+
+JOBS = {1: [{'start_time': '2026-10-18T10:00:00.000Z', 'completion_time': '2026-10-18T10:05:30.000Z',
+             'tap_exit_status': 0}],
+        2: [{'start_time': '2026-10-18T09:00:00.000Z', 'completion_time': '2026-10-18T09:01:00.000Z',
+             'tap_exit_status': 1}],
+        3: [{'start_time': '2026-10-18T09:00:00.000Z'}]}
+
+
+def check(match, payload):
+    if match.group(1) == '2':
+        raise RuntimeError('404 Client Error')
+    return {'status': 'succeeded'}
+
+
+def routes():
+    return [('get', r'^/v4/sources$', lambda match, payload: SOURCES),
+            ('get', r'^/v4/sources/(\d+)/last-connection-check$', check),
+            ('get', r'/connections/(\d+)/jobs\?', lambda match, payload: JOBS[int(match.group(1))])]
+
+
+def test_health_sweep(make_api):
+    stitch = make_api(routes())
+    rows = {i['source_name']: i for i in stitch.health_sweep(window_hours=24, max_workers=4)}
+
+    assert stitch.client.count('get', r'^/v4/sources$') == 1
+    assert stitch.client.count('post', r'^/session$') == 1
+
+    assert rows['ok']['check_status'] == 'succeeded'
+    assert rows['ok']['last_extraction_exit_status'] == 0
+    assert rows['ok']['last_extraction_duration'] == 330
+    assert not rows['ok']['stale_beyond_window']
+
+    # a failed connection check doesn't hide the extraction data
+    assert rows['no_check']['check_error'] == '404 Client Error'
+    assert rows['no_check']['last_extraction_exit_status'] == 1
+
+    assert rows['stale']['stale_beyond_window']
+    assert rows['stale']['staleness'] == 24 * 3600
+
+
+def test_odd_timestamps_dont_abort_the_sweep(make_api):
+    jobs = {1: [{'start_time': '2026-10-18T10:00:00', 'completion_time': '2026-10-18T10:05:30.000Z',
+                 'tap_exit_status': 0}],
+            2: [{'start_time': '2026-10-18T09:00:00.000Z', 'completion_time': 'yesterday'}],
+            3: JOBS[1]}
+    stitch = make_api([('get', r'^/v4/sources$', lambda match, payload: SOURCES),
+                       ('get', r'^/v4/sources/(\d+)/last-connection-check$',
+                        lambda match, payload: {'status': 'succeeded'}),
+                       ('get', r'/connections/(\d+)/jobs\?',
+                        lambda match, payload: jobs[int(match.group(1))])])
+    rows = {i['source_name']: i for i in stitch.health_sweep()}
+
+    # naive timestamps are UTC
+    assert rows['ok']['last_extraction_duration'] == 330
+    assert rows['ok']['extraction_error'] is None
+    assert rows['no_check']['extraction_error']
+    assert rows['no_check']['check_status'] == 'succeeded'
+    assert rows['stale']['last_extraction_duration'] == 330
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+import threading
+import pytest
+
+
+SOURCES = [{'id': 1, 'name': 's1', 'deleted_at': None}]
+STREAMS = [{'stream_id': 10, 'tap_stream_id': 'public-users', 'stream_name': 'users', 'selected': True}]
+
+
+def make_batches(n):
+    return [{'row_count': 10,
+             'received_at': '2026-10-18T10:{:02d}:00.000Z'.format(i % 60),
+             'started_at': '2026-10-18T10:{:02d}:10.000Z'.format(i % 60),
+             'completed_at': '2026-10-18T10:{:02d}:20.000Z'.format(i % 60)} for i in range(n)]
+
+
+def routes(batches):
+    def loads(match, payload):
+        limit, offset = int(match.group(1)), int(match.group(2))
+        return {'batches': batches[offset:offset + limit]}
+    return [('get', r'^/v4/sources$', lambda match, payload: SOURCES),
+            ('get', r'^/v4/sources/1/streams$', lambda match, payload: STREAMS),
+            ('get', r'/loading-reports/tables/users\?limit=(\d+)&offset=(\d+)', loads)]
+
+
+def test_load_reports_page_until_short_page(make_api):
+    stitch = make_api(routes(make_batches(250)))
+    end = datetime.utcnow()
+    batches = stitch.get_source_load_reports(1, end - timedelta(hours=1), end)
+
+    assert len(batches) == 250
+    assert stitch.client.count('get', r'/loading-reports/') == 3
+    assert all(i['stream_name'] == 'users' for i in batches)
+
+
+def test_load_reports_exact_page_multiple(make_api):
+    stitch = make_api(routes(make_batches(200)))
+    end = datetime.utcnow()
+    assert len(stitch.get_source_load_reports(1, end - timedelta(hours=1), end)) == 200
+    # the empty third page is what ends the paging
+    assert stitch.client.count('get', r'/loading-reports/') == 3
+
+
+def test_source_load_stats_sees_every_page(make_api):
+    pytest.importorskip('numpy')
+    stitch = make_api(routes(make_batches(250)))
+    end = datetime.utcnow()
+    stats = stitch.get_source_load_stats('s1', end - timedelta(hours=1), end)
+
+    users = stats['streams'][0]
+    assert users['batches'] == 250
+    assert users['rows'] == 2500
+    assert users['latency_p50'] == 10
+    assert users['lag_p99'] == 20
+
+
+def test_streams_are_fetched_concurrently(make_api):
+    streams = [dict(STREAMS[0], stream_id=10 + i, stream_name='t{}'.format(i)) for i in range(3)]
+    barrier = threading.Barrier(len(streams), timeout=5)
+
+    def loads(match, payload):
+        barrier.wait()
+        return {'batches': make_batches(1)}
+    stitch = make_api([('get', r'^/v4/sources/1/streams$', lambda match, payload: streams),
+                       ('get', r'/loading-reports/tables/\w+\?', loads)])
+    end = datetime.utcnow()
+    batches = stitch.get_source_load_reports(1, end - timedelta(hours=1), end)
+
+    assert [i['stream_name'] for i in batches] == ['t0', 't1', 't2']
+    assert stitch.client.count('post', r'^/session$') == 1
@@ -0,0 +1,92 @@
+import threading
+import pytest
+from stitch_api import constants
+
+
+SOURCES = [{'id': 1, 'name': 's1', 'deleted_at': None},
+           {'id': 2, 'name': 's2', 'deleted_at': None}]
+
+
+def streams(source_id, n, selected=False):
+    return [{'stream_id': source_id * 1000 + i, 'tap_stream_id': 'public-t{}'.format(i),
+             'stream_name': 't{}'.format(i), 'selected': selected} for i in range(n)]
+
+
+def routes(stream_map, updates):
+    def update(match, payload):
+        updates.append((int(match.group(1)), payload))
+        return {}
+    return [('get', r'^/v4/sources$', lambda match, payload: SOURCES),
+            ('get', r'^/v4/sources/(\d+)/streams$',
+             lambda match, payload: stream_map[int(match.group(1))]),
+            ('put', r'^/v4/sources/(\d+)/streams/metadata$', update)]
+
+
+def test_select_streams_batches_requests(make_api):
+    updates = []
+    stitch = make_api(routes({1: streams(1, 300)}, updates))
+    result = stitch.select_streams_bulk({'s1': 't*'})
+
+    assert len(updates) == 300 // constants.METADATA_BATCH_SIZE
+    assert sum(len(payload['streams']) for _, payload in updates) == 300
+    entry = updates[0][1]['streams'][0]
+    assert entry['metadata'] == [{'breadcrumb': [], 'metadata': {'selected': True}}]
+    assert result['s1']['error'] is None
+    assert len(result['s1']['streams']) == 300
+
+
+def test_select_streams_skips_unchanged(make_api):
+    updates = []
+    stitch = make_api(routes({1: streams(1, 3, selected=True)}, updates))
+    assert stitch.select_streams('s1', pattern='t*') == []
+    assert updates == []
+
+
+def test_select_streams_bulk_checks_blacklist_before_writing(make_api):
+    updates = []
+    stitch = make_api(routes({1: streams(1, 2), 2: streams(2, 2)}, updates), blacklist='s2')
+    with pytest.raises(ValueError):
+        stitch.select_streams_bulk({'s1': '*', 's2': '*'})
+    assert updates == []
+
+
+def test_select_streams_bulk_reports_errors_per_source(make_api):
+    updates = []
+
+    def update(match, payload):
+        if match.group(1) == '2':
+            raise RuntimeError('boom')
+        updates.append(payload)
+        return {}
+    stitch = make_api([('get', r'^/v4/sources$', lambda match, payload: SOURCES),
+                       ('get', r'^/v4/sources/(\d+)/streams$',
+                        lambda match, payload: streams(int(match.group(1)), 2)),
+                       ('put', r'^/v4/sources/(\d+)/streams/metadata$', update)])
+    result = stitch.select_streams_bulk({'s1': '*', 's2': '*'})
+
+    assert len(updates) == 1
+    assert result['s1']['error'] is None
+    assert result['s2']['error'] == 'boom'
+
+
+def test_select_fields_sends_property_breadcrumbs(make_api):
+    updates = []
+    schema = {'metadata': [{'breadcrumb': [], 'metadata': {'selected': True}},
+                           {'breadcrumb': ['properties', 'id'], 'metadata': {'selected': True}},
+                           {'breadcrumb': ['properties', 'email'], 'metadata': {'selected': True}},
+                           {'breadcrumb': ['properties', 'name'], 'metadata': {'selected': False}}]}
+    # both schemas have to be requested at once to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def get_schema(match, payload):
+        barrier.wait()
+        return schema
+    stitch = make_api(routes({1: streams(1, 2, selected=True)}, updates) +
+                      [('get', r'^/v4/sources/1/streams/\d+$', get_schema)])
+    stitch.select_streams('s1', pattern='t*', selected=False, fields=['email', 'name'])
+
+    assert len(updates) == 1
+    sent = updates[0][1]['streams']
+    assert [i['tap_stream_id'] for i in sent] == ['public-t0', 'public-t1']
+    assert sent[0]['metadata'] == [{'breadcrumb': ['properties', 'email'],
+                                    'metadata': {'selected': False}}]
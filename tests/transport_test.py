@@ -0,0 +1,177 @@
+import gzip
+import json
+import socket
+import threading
+import time
+import pytest
+import requests
+
+h2 = pytest.importorskip('h2')
+pytest.importorskip('httpx')
+import h2.config  # noqa: E402
+import h2.connection  # noqa: E402
+import h2.events  # noqa: E402
+from stitch_api import StitchAPI, api  # noqa: E402
+from stitch_api.transport import HTTP2Transport  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class H2cServer:
+    """Minimal cleartext HTTP/2 (prior knowledge) server, counts accepted connections"""
+
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen()
+        self.url = 'http://127.0.0.1:{}'.format(self.sock.getsockname()[1])
+        self.connections = 0
+        self.streams = 0
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def close(self):
+        self.sock.close()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        config = h2.config.H2Configuration(client_side=False, header_encoding='utf-8')
+        h2_conn = h2.connection.H2Connection(config=config)
+        h2_conn.initiate_connection()
+        conn.sendall(h2_conn.data_to_send())
+        headers = {}
+        while True:
+            data = conn.recv(65535)
+            if not data:
+                break
+            for event in h2_conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    headers[event.stream_id] = dict(event.headers)
+                elif isinstance(event, h2.events.DataReceived):
+                    h2_conn.acknowledge_received_data(len(event.data), event.stream_id)
+                elif isinstance(event, h2.events.StreamEnded):
+                    self.streams += 1
+                    self._respond(h2_conn, event.stream_id, headers.pop(event.stream_id))
+            conn.sendall(h2_conn.data_to_send())
+        conn.close()
+
+    def _respond(self, h2_conn, stream_id, headers):
+        path = headers[':path']
+        if path == '/slow':
+            time.sleep(0.5)
+        body = json.dumps({'path': path, 'accept_encoding': headers.get('accept-encoding')}).encode()
+        response_headers = [(':status', '404' if path == '/missing' else '200'),
+                            ('content-type', 'application/json')]
+        if path == '/gzip':
+            body = gzip.compress(body)
+            response_headers.append(('content-encoding', 'gzip'))
+        elif path == '/br':
+            body = brotli.compress(body)
+            response_headers.append(('content-encoding', 'br'))
+        response_headers.append(('content-length', str(len(body))))
+        h2_conn.send_headers(stream_id, response_headers)
+        h2_conn.send_data(stream_id, body, end_stream=True)
+
+
+@pytest.fixture
+def server():
+    server = H2cServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def make_transport(server):
+    transports = []
+
+    def _make_transport(url=None, **kwargs):
+        transport = HTTP2Transport(url or server.url, http1=False, **kwargs)
+        transports.append(transport)
+        return transport
+    yield _make_transport
+    for transport in transports:
+        transport.close()
+
+
+def test_concurrent_requests_share_one_connection(server, make_transport):
+    transport = make_transport(max_connections=10)
+    n = 50
+    barrier = threading.Barrier(n)
+    results = []
+
+    def fetch(i):
+        barrier.wait()
+        results.append(transport.request('get', '/item/{}'.format(i), headers={}).json()['path'])
+
+    threads = [threading.Thread(target=fetch, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == sorted('/item/{}'.format(i) for i in range(n))
+    assert server.streams == n
+    assert server.connections == 1
+
+
+def test_gzip_response_is_decoded(make_transport):
+    transport = make_transport()
+    response = transport.request('get', '/gzip', headers={'Accept-Encoding': 'gzip'})
+    assert response.http_version == 'HTTP/2'
+    assert response.json()['path'] == '/gzip'
+
+
+@pytest.mark.skipif(brotli is None, reason='brotli not installed')
+def test_br_response_is_decoded(make_transport):
+    transport = make_transport()
+    response = transport.request('get', '/br', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.json()['path'] == '/br'
+
+
+def test_errors_are_requests_exceptions(make_transport):
+    transport = make_transport()
+    with pytest.raises(requests.HTTPError) as error:
+        transport.request('get', '/missing', headers={})
+    assert error.value.response.status_code == 404
+
+    # bound but never listening, so connections are refused
+    closed = socket.socket()
+    closed.bind(('127.0.0.1', 0))
+    unreachable = make_transport('http://127.0.0.1:{}'.format(closed.getsockname()[1]))
+    with pytest.raises(requests.ConnectionError) as error:
+        unreachable.request('get', '/', headers={})
+    assert isinstance(error.value.__cause__, unreachable.httpx.ConnectError)
+    closed.close()
+
+
+def test_request_builders_run_over_http2(server):
+    with StitchAPI('key', 1234, 'user', 'password', transport='http2') as stitch:
+        stitch.client.close()
+        stitch.client = HTTP2Transport(server.url, http1=False)
+        response = stitch._execute_request(api.Source.list, return_json=True)
+        assert response['path'] == '/v4/sources'
+        assert 'gzip' in response['accept_encoding']
+    # closing stops the event loop thread
+    assert not stitch.client._thread.is_alive()
+    stitch.close()
+
+
+def test_timeout_matches_requests_transport(make_transport):
+    # like requests, no timeout unless one is asked for
+    transport = make_transport()
+    assert transport.client.timeout == transport.httpx.Timeout(None)
+    assert transport.request('get', '/slow', headers={}).json()['path'] == '/slow'
+
+    with pytest.raises(requests.Timeout) as error:
+        make_transport(timeout=0.1).request('get', '/slow', headers={})
+    assert isinstance(error.value.__cause__, transport.httpx.TimeoutException)
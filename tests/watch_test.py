@@ -0,0 +1,200 @@
+from copy import deepcopy
+from datetime import datetime, timedelta
+from urllib import parse as url_parse
+from stitch_api import watch
+
+
+def iso(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def ago(**kwargs):
+    return iso(datetime.utcnow() - timedelta(**kwargs))
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class Account:
+    """Mutable fake Stitch account served through the fake transport"""
+
+    def __init__(self, n_sources):
+        self.sources = {i: {'id': i, 'name': 's{}'.format(i), 'deleted_at': None, 'paused_at': None,
+                            'schedule': {'type': 'interval', 'frequency_in_minutes': '30'}}
+                        for i in range(1, n_sources + 1)}
+        self.jobs = {i: [{'start_time': ago(hours=3), 'completion_time': ago(hours=2),
+                          'tap_exit_status': 0}]
+                     for i in self.sources}
+        self.checks = {i: 'succeeded' for i in self.sources}
+        self.stats = []
+        self.logged_in = False
+
+    def login(self, match, payload):
+        self.logged_in = True
+        return {}
+
+    def extractions(self, match, payload):
+        start = url_parse.unquote(match.group(2))
+        return deepcopy([i for i in self.jobs[int(match.group(1))] if i['start_time'] >= start])
+
+    def daily_report(self, match, payload):
+        if not self.logged_in:
+            raise RuntimeError('daily report without login')
+        return {'stats': deepcopy(self.stats)}
+
+    def routes(self):
+        return [('post', r'^/session$', self.login),
+                ('get', r'^/v4/sources$', lambda match, payload: deepcopy(list(self.sources.values()))),
+                ('get', r'^/v4/sources/(\d+)/last-connection-check$',
+                 lambda match, payload: {'status': self.checks[int(match.group(1))]}),
+                ('get', r'/connections/(\d+)/jobs\?time-range-start=([^&]+)', self.extractions),
+                ('get', r'/stats/daily$', self.daily_report)]
+
+
+def make_watcher(make_api, account, **kwargs):
+    stitch = make_api(account.routes())
+    clock = FakeClock()
+    watcher = stitch.watch(clock=clock, sleep=clock.sleep, **kwargs)
+    return stitch, watcher, clock
+
+
+def test_daily_report_logs_in_when_nothing_else_did(make_api):
+    account = Account(2)
+    for source in account.sources.values():
+        source['paused_at'] = ago(hours=1)
+    account.stats = [{'connection_id': 1, 'rows': 10}]
+    stitch, watcher, clock = make_watcher(make_api, account)
+    watcher.poll()
+
+    assert stitch.client.count('get', r'/jobs\?') == 0
+    assert stitch.client.count('get', r'/stats/daily$') == 1
+    assert watcher.sources[1].daily_report == [{'connection_id': 1, 'rows': 10}]
+
+
+def test_change_events(make_api):
+    account = Account(3)
+    stitch, watcher, clock = make_watcher(make_api, account)
+    events = []
+    finished = []
+    watcher.on('*', events.append)
+    watcher.on(watch.SYNC_FINISHED, finished.append)
+
+    assert watcher.poll() == []
+
+    account.jobs[1].append({'start_time': ago(minutes=5)})
+    account.sources[1]['schedule'] = {'type': 'cron', 'cron_expression': '0 0 * * * ?'}
+    account.sources[2]['paused_at'] = ago(minutes=1)
+    account.checks[3] = 'failed'
+    clock.now = 900
+    assert [(i.type, i.source_name) for i in watcher.poll()] == [
+        (watch.SCHEDULE_CHANGED, 's1'),
+        (watch.PAUSED, 's2'),
+        (watch.SYNC_STARTED, 's1'),
+        (watch.CONNECTION_CHECK_FAILED, 's3'),
+    ]
+
+    # running sources are polled at active_interval, idle ones are not due yet
+    clock.now = 900 + watcher.active_interval
+    account.jobs[1][-1].update(completion_time=ago(minutes=1), tap_exit_status=1)
+    before = len(stitch.client.requests)
+    assert [(i.type, i.source_name) for i in watcher.poll()] == [(watch.SYNC_FINISHED, 's1')]
+    assert stitch.client.count('get', r'/jobs\?') - \
+        len([i for i in stitch.client.requests[:before] if '/jobs?' in i[1]]) == 1
+    assert finished[0].data['tap_exit_status'] == 1
+
+    account.checks[3] = 'succeeded'
+    account.sources[2]['paused_at'] = None
+    account.stats = [{'connection_id': 1, 'rows': 5}]
+    clock.now = 3600
+    assert [(i.type, i.source_name) for i in watcher.poll()] == [
+        (watch.UNPAUSED, 's2'),
+        (watch.CONNECTION_CHECK_RECOVERED, 's3'),
+        (watch.DAILY_REPORT_CHANGED, 's1'),
+    ]
+    assert len(events) == 8
+
+
+def test_sync_started_and_finished_between_polls(make_api):
+    account = Account(1)
+    stitch, watcher, clock = make_watcher(make_api, account)
+    watcher.poll()
+    account.jobs[1].append({'start_time': ago(minutes=5), 'completion_time': ago(minutes=1),
+                            'tap_exit_status': 0})
+    clock.now = watcher.idle_interval
+    assert [i.type for i in watcher.poll()] == [watch.SYNC_STARTED, watch.SYNC_FINISHED]
+
+
+def test_request_volume_is_far_below_full_polling(make_api):
+    n_sources = 50
+    minutes = 200
+    account = Account(n_sources)
+    stitch, watcher, clock = make_watcher(make_api, account)
+    while clock.now < minutes * 60:
+        watcher.poll()
+        clock.sleep(max(watcher._next_due() - clock(), 1))
+
+    requests = stitch.client.requests
+    assert stitch.client.count('get', r'^/v4/sources$') == minutes
+    assert stitch.client.count('get', r'/jobs\?') == n_sources * (minutes * 60 // watcher.idle_interval)
+    assert stitch.client.count('get', r'/stats/daily$') == minutes * 60 // watcher.report_interval + 1
+    assert stitch.client.count('post', r'^/session$') == 1
+    # every minute: list sources, extractions per source, daily report per source (list + stats)
+    full_polling = minutes * (1 + 3 * n_sources)
+    assert len(requests) * 10 < full_polling
+
+
+def test_running_sync_outside_window_stays_tracked(make_api):
+    account = Account(1)
+    started = datetime.utcnow() - timedelta(minutes=50)
+    account.jobs[1] = [{'start_time': iso(started)}]
+    stitch, watcher, clock = make_watcher(make_api, account, extraction_window=timedelta(hours=1))
+    watcher.poll()
+    assert watcher.sources[1].running
+
+    # the job is now older than the window but still gets found and finishes
+    watcher.extraction_window = timedelta(minutes=10)
+    account.jobs[1][0].update(completion_time=ago(seconds=0), tap_exit_status=0)
+    clock.now = watcher.active_interval
+    assert [i.type for i in watcher.poll()] == [watch.SYNC_FINISHED]
+    assert not watcher.sources[1].running
+
+
+def test_lost_running_sync_falls_back_to_idle_polling(make_api):
+    account = Account(1)
+    account.jobs[1] = [{'start_time': ago(minutes=5)}]
+    stitch, watcher, clock = make_watcher(make_api, account)
+    watcher.poll()
+    assert watcher.sources[1].running
+
+    account.jobs[1] = []
+    clock.now = watcher.active_interval
+    watcher.poll()
+    state = watcher.sources[1]
+    assert not state.running
+    assert state.next_extraction_poll == clock.now + watcher.idle_interval
+
+
+def test_running_connection_checks_dont_break_transitions(make_api):
+    account = Account(1)
+    stitch, watcher, clock = make_watcher(make_api, account)
+    events = []
+    watcher.on(watch.CONNECTION_CHECK_FAILED, events.append)
+    watcher.on(watch.CONNECTION_CHECK_RECOVERED, events.append)
+    watcher.poll()
+    for status in ['failed', 'running', 'succeeded', 'running', 'failed']:
+        account.checks[1] = status
+        clock.now += watcher.check_interval
+        watcher.poll()
+
+    assert [i.type for i in events] == [watch.CONNECTION_CHECK_FAILED,
+                                        watch.CONNECTION_CHECK_RECOVERED,
+                                        watch.CONNECTION_CHECK_FAILED]